@@ -10,26 +10,56 @@ parse them.
 """
 
 import argparse
+import functools
+import hashlib
+import importlib.util
 import json
+import operator
 import os
+import re
 import sys
 import time
 import subprocess
 import shutil
+import threading
+from collections import deque
 from pathlib import Path
 
+try:
+    import orjson  # C JSON parser, 2-5x faster than stdlib json
+except ImportError:
+    orjson = None
+
+# PATH walks show up when the same executables are probed repeatedly.
+which = functools.lru_cache(maxsize=None)(shutil.which)
+
 
 # ---------------------------------------------------------------------------
 # Progress helpers
 # ---------------------------------------------------------------------------
 
+_last_training_emit = [0.0]
+
+
 def emit(status: str, progress: float | None = None, **kwargs):
-    """Print a JSON progress line to stdout."""
+    """Print a JSON progress line to stdout.
+
+    Per-step "training" updates are throttled to ~5 Hz so fast training loops
+    don't block on a write(2) syscall every step; the final update (progress
+    >= 0.999) always goes through.
+    """
+    if status == "training" and (progress is None or progress < 0.999):
+        now = time.monotonic()
+        if now - _last_training_emit[0] < 0.2:
+            return
+        _last_training_emit[0] = now
     msg = {"status": status}
     if progress is not None:
         msg["progress"] = round(progress, 3)
     msg.update(kwargs)
-    print(json.dumps(msg), flush=True)
+    data = orjson.dumps(msg) if orjson is not None else json.dumps(msg).encode("utf-8")
+    sys.stdout.buffer.write(data + b"\n")
+    sys.stdout.flush()
 
 
 def emit_error(message: str):
@@ -41,34 +71,79 @@ def emit_error(message: str):
 # Data loading
 # ---------------------------------------------------------------------------
 
-def load_training_data(data_path: str) -> list[dict]:
-    """Load JSONL training data (each line: {prompt, response})."""
-    entries: list[dict] = []
-    with open(data_path, "r", encoding="utf-8") as f:
+def iter_chatml(path: str):
+    """Stream JSONL training data (each line: {prompt, response}) as chat-ML dicts.
+
+    Parses and formats in a single pass so the full dataset is never
+    materialized as Python objects.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    get_pair = operator.itemgetter("prompt", "response")  # both fields in one C call
+    with open(path, "rb") as f:
         for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
+            if not line.strip():
                 continue
             try:
-                entry = json.loads(line)
-                if "prompt" in entry and "response" in entry:
-                    entries.append(entry)
-            except json.JSONDecodeError:
+                entry = loads(line)
+            except ValueError:
                 emit("warning", message=f"Skipping malformed line {line_num}")
-    return entries
+                continue
+            try:
+                prompt, response = get_pair(entry)
+            except (KeyError, TypeError):
+                continue
+            # Explicit nulls count as missing too, matching the Arrow path's
+            # null filter — never let content: None reach the chat template.
+            if prompt is None or response is None:
+                continue
+            yield {
+                "messages": [
+                    {"role": "user", "content": prompt},
+                    {"role": "assistant", "content": response},
+                ]
+            }
 
 
-def format_for_training(entries: list[dict]) -> list[dict]:
-    """Convert entries into the chat-ML format expected by most trainers."""
-    formatted = []
-    for entry in entries:
-        formatted.append({
-            "messages": [
-                {"role": "user", "content": entry["prompt"]},
-                {"role": "assistant", "content": entry["response"]},
-            ]
-        })
-    return formatted
+def load_chatml_dataset(data_path: str):
+    """Build a HuggingFace Dataset of chat-ML rows from the JSONL file.
+
+    Prefers the Arrow-native JSON reader, which parses straight into a
+    columnar table with no per-row Python objects, and falls back to the
+    streaming generator when the strict reader rejects the file (e.g.
+    malformed lines, which the generator skips with a warning).
+    """
+    from datasets import Dataset
+
+    try:
+        ds = Dataset.from_json(data_path)
+        if {"prompt", "response"} <= set(ds.column_names):
+            # from_json fills missing fields with null; drop those rows so
+            # the dataset matches what the generator (and main's counting
+            # pass) would keep, instead of feeding content: None into the
+            # chat template.
+            ds = ds.filter(
+                lambda batch: [
+                    prompt is not None and response is not None
+                    for prompt, response in zip(batch["prompt"], batch["response"])
+                ],
+                batched=True,
+            )
+            return ds.map(
+                lambda batch: {
+                    "messages": [
+                        [
+                            {"role": "user", "content": prompt},
+                            {"role": "assistant", "content": response},
+                        ]
+                        for prompt, response in zip(batch["prompt"], batch["response"])
+                    ]
+                },
+                batched=True,
+                remove_columns=ds.column_names,
+            )
+    except Exception:
+        pass
+    return Dataset.from_generator(iter_chatml, gen_kwargs={"path": data_path})
 
 
 # ---------------------------------------------------------------------------
@@ -77,8 +152,9 @@ def format_for_training(entries: list[dict]) -> list[dict]:
 
 def train_unsloth(
     base_model: str,
-    dataset: list[dict],
-    output_dir: str,
+    data_path: str,
+    num_examples: int,
+    output_dir: Path,
     lora_rank: int,
     epochs: int,
     batch_size: int,
@@ -114,18 +190,18 @@ def train_unsloth(
     emit("preparing_data", 0.15)
 
     def formatting_func(examples):
-        texts = []
-        for msgs in examples["messages"]:
-            text = tokenizer.apply_chat_template(msgs, tokenize=False, add_generation_prompt=False)
-            texts.append(text)
+        # One call per batch: the compiled Jinja template is reused across
+        # the whole list instead of being re-entered per row.
+        texts = tokenizer.apply_chat_template(
+            examples["messages"], tokenize=False, add_generation_prompt=False
+        )
         return {"text": texts}
 
-    from datasets import Dataset
-    ds = Dataset.from_list(dataset)
+    ds = load_chatml_dataset(data_path)
     ds = ds.map(formatting_func, batched=True)
 
     training_args = TrainingArguments(
-        output_dir=os.path.join(output_dir, "checkpoints"),
+        output_dir=str(output_dir / "checkpoints"),
         per_device_train_batch_size=batch_size,
         num_train_epochs=epochs,
         learning_rate=lr,
@@ -135,6 +211,11 @@ def train_unsloth(
         warmup_ratio=0.05,
         lr_scheduler_type="cosine",
         optim="adamw_8bit",
+        # Prepare and pin the next batch while the GPU is busy with the
+        # current one.
+        dataloader_num_workers=min(4, os.cpu_count() or 1),
+        dataloader_pin_memory=True,
+        dataloader_persistent_workers=True,
     )
 
     class ProgressCallback:
@@ -158,13 +239,15 @@ def train_unsloth(
     trainer.train()
 
     emit("saving_adapter", 0.82)
-    adapter_dir = os.path.join(output_dir, "adapter")
-    model.save_pretrained(adapter_dir)
+    adapter_dir = output_dir / "adapter"
+    # Saved synchronously: save_pretrained_merged dequantizes and merges the
+    # same weight tensors, so the adapter must be fully written first.
+    model.save_pretrained(adapter_dir, safe_serialization=True)
     tokenizer.save_pretrained(adapter_dir)
 
     emit("merging_adapter", 0.85)
-    merged_dir = os.path.join(output_dir, "merged")
-    model.save_pretrained_merged(merged_dir, tokenizer, save_method="merged_16bit")
+    merged_dir = output_dir / "merged"
+    model.save_pretrained_merged(str(merged_dir), tokenizer, save_method="merged_16bit")
 
     return merged_dir
 
@@ -175,8 +258,9 @@ def train_unsloth(
 
 def train_mlx(
     base_model: str,
-    dataset: list[dict],
-    output_dir: str,
+    data_path: str,
+    num_examples: int,
+    output_dir: Path,
     lora_rank: int,
     epochs: int,
     batch_size: int,
@@ -189,54 +273,73 @@ def train_mlx(
     emit("loading_model", 0.05)
 
     # Prepare data files that mlx-lm expects
-    data_dir = os.path.join(output_dir, "mlx_data")
-    os.makedirs(data_dir, exist_ok=True)
-
-    # mlx-lm expects train.jsonl with {text} or {messages} format
-    train_path = os.path.join(data_dir, "train.jsonl")
-    with open(train_path, "w", encoding="utf-8") as f:
-        for item in dataset:
-            f.write(json.dumps(item) + "\n")
-
-    # Write a small validation split (last 10% or at least 1)
-    split = max(1, len(dataset) // 10)
-    valid_path = os.path.join(data_dir, "valid.jsonl")
-    with open(valid_path, "w", encoding="utf-8") as f:
-        for item in dataset[-split:]:
-            f.write(json.dumps(item) + "\n")
+    data_dir = output_dir / "mlx_data"
+    data_dir.mkdir(exist_ok=True)
+
+    # mlx-lm expects train.jsonl with {text} or {messages} format, plus a
+    # small validation split (last 10% or at least 1). Write both files in a
+    # single pass so the validation rows aren't parsed and serialized twice.
+    split = max(1, num_examples // 10)
+    val_start = num_examples - split
+    train_path = data_dir / "train.jsonl"
+    valid_path = data_dir / "valid.jsonl"
+    with open(train_path, "wb") as train_f, open(valid_path, "wb") as valid_f:
+        for i, item in enumerate(iter_chatml(data_path)):
+            if orjson is not None:
+                line = orjson.dumps(item) + b"\n"
+            else:
+                line = json.dumps(item).encode("utf-8") + b"\n"
+            train_f.write(line)
+            if i >= val_start:
+                valid_f.write(line)
 
     emit("training", 0.15)
 
-    adapter_dir = os.path.join(output_dir, "adapter")
-    os.makedirs(adapter_dir, exist_ok=True)
+    adapter_dir = output_dir / "adapter"
+    adapter_dir.mkdir(exist_ok=True)
 
     # Use mlx_lm.lora CLI for training
+    total_iters = epochs * max(1, num_examples // batch_size)
     cmd = [
         sys.executable, "-m", "mlx_lm.lora",
         "--model", base_model,
-        "--data", data_dir,
-        "--adapter-path", adapter_dir,
+        "--data", str(data_dir),
+        "--adapter-path", str(adapter_dir),
         "--train",
         "--batch-size", str(batch_size),
         "--num-layers", str(lora_rank),
-        "--iters", str(epochs * max(1, len(dataset) // batch_size)),
+        "--iters", str(total_iters),
         "--learning-rate", str(lr),
     ]
 
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    # Stream the trainer's output instead of buffering it until completion,
+    # re-emitting iteration lines as progress so the orchestrator isn't
+    # silent for the whole training run.
+    iter_re = re.compile(r"Iter (\d+):.*?loss[ =]+([\d.]+)", re.IGNORECASE)
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+    )
+    tail: deque[str] = deque(maxlen=30)
+    for line in proc.stdout:
+        tail.append(line)
+        match = iter_re.search(line)
+        if match:
+            pct = 0.15 + 0.65 * min(1.0, int(match.group(1)) / total_iters)
+            emit("training", pct, loss=float(match.group(2)))
+    proc.wait()
     if proc.returncode != 0:
-        emit_error(f"MLX training failed: {proc.stderr[:500]}")
+        emit_error(f"MLX training failed: {''.join(tail)[-500:]}")
 
     emit("training", 0.80)
 
     # Fuse adapter into the model
     emit("merging_adapter", 0.85)
-    merged_dir = os.path.join(output_dir, "merged")
+    merged_dir = output_dir / "merged"
     fuse_cmd = [
         sys.executable, "-m", "mlx_lm.fuse",
         "--model", base_model,
-        "--adapter-path", adapter_dir,
-        "--save-path", merged_dir,
+        "--adapter-path", str(adapter_dir),
+        "--save-path", str(merged_dir),
     ]
     proc = subprocess.run(fuse_cmd, capture_output=True, text=True)
     if proc.returncode != 0:
@@ -251,35 +354,79 @@ def train_mlx(
 
 def train_transformers(
     base_model: str,
-    dataset: list[dict],
-    output_dir: str,
+    data_path: str,
+    num_examples: int,
+    output_dir: Path,
     lora_rank: int,
     epochs: int,
     batch_size: int,
     lr: float,
+    quantize: str = "none",
+    compile_model: bool = False,
 ):
     from transformers import (
         AutoModelForCausalLM,
         AutoTokenizer,
+        BitsAndBytesConfig,
+        DataCollatorForLanguageModeling,
         TrainingArguments,
         Trainer,
     )
-    from peft import LoraConfig, get_peft_model
-    from datasets import Dataset
+    from peft import (
+        LoraConfig,
+        get_peft_model,
+        get_peft_model_state_dict,
+        prepare_model_for_kbit_training,
+    )
     import torch
 
     emit("loading_model", 0.05)
 
+    has_cuda = torch.cuda.is_available()
+    has_bitsandbytes = has_cuda and importlib.util.find_spec("bitsandbytes") is not None
+    use_bf16 = has_cuda and torch.cuda.is_bf16_supported()
+
     tokenizer = AutoTokenizer.from_pretrained(base_model, trust_remote_code=True)
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
 
-    model = AutoModelForCausalLM.from_pretrained(
-        base_model,
-        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-        device_map="auto" if torch.cuda.is_available() else None,
-        trust_remote_code=True,
-    )
+    if use_bf16:
+        torch_dtype = torch.bfloat16
+    elif has_cuda:
+        torch_dtype = torch.float16
+    else:
+        torch_dtype = torch.float32
+
+    model_kwargs = {
+        "torch_dtype": torch_dtype,
+        "device_map": "auto" if has_cuda else None,
+        "trust_remote_code": True,
+    }
+    # FlashAttention-2 fuses the attention kernel: O(N) memory instead of
+    # O(N^2) and roughly 2x faster on long sequences.
+    if has_cuda and importlib.util.find_spec("flash_attn") is not None:
+        model_kwargs["attn_implementation"] = "flash_attention_2"
+
+    # Optional quantized base (QLoRA): NF4 with double quantization, or
+    # plain 8-bit. Lets 7B-class models fit on single-GPU desktops.
+    quantized = quantize != "none" and has_bitsandbytes
+    if quantize != "none" and not has_bitsandbytes:
+        emit("warning", message=f"--quantize {quantize} requires CUDA and bitsandbytes; "
+             "loading the base model unquantized.")
+    if quantized:
+        if quantize == "nf4":
+            model_kwargs["quantization_config"] = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_use_double_quant=True,
+                bnb_4bit_compute_dtype=torch.bfloat16 if use_bf16 else torch.float16,
+            )
+        else:
+            model_kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+
+    model = AutoModelForCausalLM.from_pretrained(base_model, **model_kwargs)
+    if quantized:
+        model = prepare_model_for_kbit_training(model)
 
     emit("applying_lora", 0.10)
     lora_config = LoraConfig(
@@ -292,29 +439,70 @@ def train_transformers(
     )
     model = get_peft_model(model, lora_config)
     model.print_trainable_parameters()
+    # Needed for gradient checkpointing: gradients must flow through the
+    # frozen base model's (non-leaf) input embeddings.
+    model.enable_input_require_grads()
+
+    # Opt-in: fuses pointwise ops and trims per-step Python overhead, but can
+    # cost extra memory when combined with gradient checkpointing, so it
+    # stays behind its own flag. Only the object handed to the Trainer is
+    # compiled — the OptimizedModule wrapper prefixes state_dict keys with
+    # _orig_mod., which would corrupt the saved adapter, so snapshotting,
+    # saving and merging keep using the plain PeftModel.
+    trained_model = model
+    if compile_model and hasattr(torch, "compile"):
+        trained_model = torch.compile(model, mode="reduce-overhead", dynamic=True)
 
     emit("preparing_data", 0.15)
 
-    def tokenize(example):
-        msgs = example["messages"]
-        text = tokenizer.apply_chat_template(msgs, tokenize=False, add_generation_prompt=False)
-        tokens = tokenizer(text, truncation=True, max_length=2048, padding="max_length")
-        tokens["labels"] = tokens["input_ids"].copy()
-        return tokens
-
-    ds = Dataset.from_list(dataset)
-    ds = ds.map(tokenize, remove_columns=ds.column_names)
+    def tokenize(examples):
+        texts = tokenizer.apply_chat_template(
+            examples["messages"], tokenize=False, add_generation_prompt=False
+        )
+        # No padding here — the collator pads each batch to its longest sample
+        # (and fills in labels), so short samples don't burn compute on pad tokens.
+        return tokenizer(texts, truncation=True, max_length=2048, padding=False)
+
+    ds = load_chatml_dataset(data_path)
+
+    # Key the tokenization cache on the data file, base model and sequence
+    # length so re-runs with a different LR or epoch count memory-map the
+    # existing Arrow file instead of re-tokenizing.
+    fingerprint = hashlib.blake2b(
+        f"{data_path}:{os.path.getmtime(data_path)}:{base_model}:2048".encode()
+    ).hexdigest()[:16]
+    ds = ds.map(
+        tokenize,
+        batched=True,
+        batch_size=1000,
+        num_proc=min(8, os.cpu_count() or 1),
+        remove_columns=ds.column_names,
+        new_fingerprint=fingerprint,
+        cache_file_name=str(output_dir / f"tok-{fingerprint}.arrow"),
+    )
 
     training_args = TrainingArguments(
-        output_dir=os.path.join(output_dir, "checkpoints"),
+        output_dir=str(output_dir / "checkpoints"),
         per_device_train_batch_size=batch_size,
         num_train_epochs=epochs,
         learning_rate=lr,
-        fp16=torch.cuda.is_available(),
+        bf16=use_bf16,
+        fp16=has_cuda and not use_bf16,
         logging_steps=1,
         save_strategy="epoch",
         warmup_ratio=0.05,
         lr_scheduler_type="cosine",
+        group_by_length=True,
+        gradient_checkpointing=True,
+        gradient_checkpointing_kwargs={"use_reentrant": False},
+        # Paged variant survives the memory spikes gradient checkpointing
+        # and quantized bases produce.
+        optim="paged_adamw_8bit" if has_bitsandbytes else "adamw_torch",
+        # Prepare and pin the next batch while the GPU is busy with the
+        # current one.
+        dataloader_num_workers=min(4, os.cpu_count() or 1),
+        dataloader_pin_memory=True,
+        dataloader_persistent_workers=True,
     )
 
     class ProgressCallback:
@@ -327,34 +515,68 @@ def train_transformers(
 
     emit("training", 0.20)
     trainer = Trainer(
-        model=model,
+        model=trained_model,
         args=training_args,
         train_dataset=ds,
+        data_collator=DataCollatorForLanguageModeling(tokenizer, mlm=False),
         callbacks=[ProgressCallback()],
     )
     trainer.train()
 
     emit("saving_adapter", 0.82)
-    adapter_dir = os.path.join(output_dir, "adapter")
-    model.save_pretrained(adapter_dir)
-    tokenizer.save_pretrained(adapter_dir)
+    adapter_dir = output_dir / "adapter"
 
-    emit("merging_adapter", 0.85)
-    from peft import PeftModel
-    base_model_reloaded = AutoModelForCausalLM.from_pretrained(
-        base_model,
-        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-        device_map="auto" if torch.cuda.is_available() else None,
-        trust_remote_code=True,
-    )
-    merged_model = PeftModel.from_pretrained(base_model_reloaded, adapter_dir)
-    merged_model = merged_model.merge_and_unload()
+    # Snapshot the LoRA tensors (tiny) before merge_and_unload mutates the
+    # model, then write the snapshot in the background so its fsyncs overlap
+    # with the merge and the merged-model save.
+    adapter_state = {
+        name: tensor.detach().clone().cpu()
+        for name, tensor in get_peft_model_state_dict(model).items()
+    }
+
+    def save_adapter():
+        model.save_pretrained(adapter_dir, safe_serialization=True, state_dict=adapter_state)
+        tokenizer.save_pretrained(adapter_dir)
+
+    save_thread = threading.Thread(target=save_adapter)
+    save_thread.start()
 
-    merged_dir = os.path.join(output_dir, "merged")
-    os.makedirs(merged_dir, exist_ok=True)
-    merged_model.save_pretrained(merged_dir)
+    emit("merging_adapter", 0.85)
+    if quantized:
+        # Merging into a bitsandbytes base would fold the adapter into
+        # quantized weights (lossy, and rejected by peft for 8-bit), and the
+        # result would be unreadable for the GGUF converter. Standard QLoRA
+        # recipe instead: reload the base unquantized and merge the saved
+        # adapter into it.
+        from peft import PeftModel
+
+        save_thread.join()  # the reload below reads the adapter from disk
+        # The trainer still holds the model (trainer.model/model_wrapped)
+        # and the paged optimizer state — drop every reference, or the
+        # quantized base stays resident underneath the unquantized reload.
+        trainer.optimizer = None
+        del trainer, trained_model, model
+        if has_cuda:
+            torch.cuda.empty_cache()
+        base = AutoModelForCausalLM.from_pretrained(
+            base_model,
+            torch_dtype=torch_dtype,
+            device_map="auto" if has_cuda else None,
+            trust_remote_code=True,
+        )
+        merged_model = PeftModel.from_pretrained(base, adapter_dir).merge_and_unload()
+    else:
+        # The in-memory model is already a PeftModel wrapping the base, so
+        # merge it directly instead of reloading the base model from disk
+        # (which would double peak memory and add a multi-gigabyte read).
+        merged_model = model.merge_and_unload()
+
+    merged_dir = output_dir / "merged"
+    merged_dir.mkdir(exist_ok=True)
+    merged_model.save_pretrained(merged_dir, safe_serialization=True, max_shard_size="5GB")
     tokenizer.save_pretrained(merged_dir)
 
+    save_thread.join()
     return merged_dir
 
 
@@ -362,68 +584,92 @@ def train_transformers(
 # GGUF conversion
 # ---------------------------------------------------------------------------
 
-def convert_to_gguf(merged_dir: str, output_dir: str, model_name: str) -> str:
+def find_gguf_converter() -> list[str] | None:
+    """
+    Locate llama.cpp's convert_hf_to_gguf entry point.
+
+    Called before training starts so a missing converter is reported up
+    front instead of after a long training run.
     """
-    Convert merged HuggingFace model to GGUF using llama.cpp's convert script.
-    Returns the path to the resulting GGUF file.
+    # Try llama.cpp's convert_hf_to_gguf.py (installed via pip or local);
+    # pip-installed llama-cpp-python sometimes ships the script
+    for name in ["convert_hf_to_gguf", "convert-hf-to-gguf"]:
+        script = which(name)
+        if script:
+            return [script]
+
+    # Try running as a Python module (llama_cpp may expose it)
+    # Fall back to calling the script from the llama.cpp repo if available
+    try:
+        import llama_cpp
+        candidate = Path(llama_cpp.__file__).parent.parent / "convert_hf_to_gguf.py"
+        if candidate.is_file():
+            return [sys.executable, str(candidate)]
+    except ImportError:
+        pass
+
+    # Last resort: look in PATH-adjacent locations
+    for name in ["convert_hf_to_gguf.py", "convert-hf-to-gguf.py"]:
+        found = which(name)
+        if found:
+            return [sys.executable, found]
+
+    return None
+
+
+def convert_to_gguf(
+    merged_dir: Path, output_dir: Path, model_name: str, convert_cmd: list[str] | None
+) -> tuple[subprocess.Popen | None, Path]:
+    """
+    Start converting the merged HuggingFace model to GGUF using llama.cpp's
+    convert script. The merged model on disk is immutable at this point, so
+    the conversion runs as a background subprocess while the caller finishes
+    its remaining work; output goes to a log file to keep memory bounded.
+    Returns (process, gguf_path), with process None when no converter exists.
     """
+    if convert_cmd is None:
+        # main already warned about the missing converter during discovery
+        return None, merged_dir
+
     emit("converting_gguf", 0.90)
 
-    gguf_path = os.path.join(output_dir, f"{model_name}.gguf")
+    gguf_path = output_dir / f"{model_name}.gguf"
 
-    # Try llama.cpp's convert_hf_to_gguf.py (installed via pip or local)
-    convert_scripts = [
-        # pip-installed llama-cpp-python sometimes ships the script
-        shutil.which("convert_hf_to_gguf"),
-        shutil.which("convert-hf-to-gguf"),
+    cmd = convert_cmd + [
+        str(merged_dir),
+        "--outfile", str(gguf_path),
+        "--outtype", "q8_0",
     ]
 
-    # Also look for the script via python module
-    convert_cmd = None
-    for script in convert_scripts:
-        if script:
-            convert_cmd = [script]
-            break
+    with open(output_dir / "gguf-convert.log", "wb") as log_f:
+        proc = subprocess.Popen(cmd, stdout=log_f, stderr=subprocess.STDOUT)
+    return proc, gguf_path
 
-    if convert_cmd is None:
-        # Try running as a Python module (llama_cpp may expose it)
-        # Fall back to calling the script from the llama.cpp repo if available
-        try:
-            import llama_cpp
-            llama_dir = os.path.dirname(os.path.dirname(llama_cpp.__file__))
-            candidate = os.path.join(llama_dir, "convert_hf_to_gguf.py")
-            if os.path.isfile(candidate):
-                convert_cmd = [sys.executable, candidate]
-        except ImportError:
-            pass
 
-    if convert_cmd is None:
-        # Last resort: look in PATH-adjacent locations
-        for name in ["convert_hf_to_gguf.py", "convert-hf-to-gguf.py"]:
-            found = shutil.which(name)
-            if found:
-                convert_cmd = [sys.executable, found]
-                break
+# ---------------------------------------------------------------------------
+# Backend selection
+# ---------------------------------------------------------------------------
 
-    if convert_cmd is None:
-        emit("warning", message="GGUF conversion script not found; skipping GGUF conversion. "
-             "The merged HuggingFace model is available in the output directory.")
-        return merged_dir
+# Module whose presence indicates the backend is installed, plus the install
+# hint shown when it isn't.
+BACKEND_PROBES = {
+    "unsloth": ("unsloth", "pip install unsloth"),
+    "mlx": ("mlx", "pip install mlx mlx-lm"),
+    "transformers": ("transformers", "pip install transformers peft datasets"),
+}
 
-    cmd = convert_cmd + [
-        merged_dir,
-        "--outfile", gguf_path,
-        "--outtype", "q8_0",
-    ]
 
-    proc = subprocess.run(cmd, capture_output=True, text=True)
-    if proc.returncode != 0:
-        emit("warning", message=f"GGUF conversion failed: {proc.stderr[:300]}. "
-             "Merged model is still available.")
-        return merged_dir
+def detect_backend() -> str:
+    """Pick the best available training backend: unsloth > mlx > transformers.
 
-    emit("gguf_complete", 0.95)
-    return gguf_path
+    Probes with importlib.util.find_spec, which only checks importability —
+    milliseconds, versus the multi-second cost of actually importing
+    unsloth/torch.
+    """
+    for backend, (module, _) in BACKEND_PROBES.items():
+        if importlib.util.find_spec(module) is not None:
+            return backend
+    emit_error("No training backend available. Install one of: unsloth, mlx, transformers")
 
 
 # ---------------------------------------------------------------------------
@@ -439,29 +685,51 @@ def main():
     parser.add_argument("--epochs", type=int, default=3, help="Number of training epochs")
     parser.add_argument("--batch-size", type=int, default=4, help="Training batch size")
     parser.add_argument("--lr", type=float, default=2e-4, help="Learning rate")
-    parser.add_argument("--backend", choices=["unsloth", "mlx", "transformers"], default="transformers",
-                        help="Training backend to use")
+    parser.add_argument("--quantize", choices=["nf4", "8bit", "none"], default="none",
+                        help="Quantize the base model for training (transformers backend)")
+    parser.add_argument("--compile", action="store_true",
+                        help="Wrap the model in torch.compile (transformers backend)")
+    parser.add_argument("--backend", choices=["auto", "unsloth", "mlx", "transformers"],
+                        default="auto", help="Training backend to use")
     args = parser.parse_args()
 
-    os.makedirs(args.output_dir, exist_ok=True)
+    # Resolve the backend before any data I/O so an unavailable choice fails
+    # in milliseconds rather than after the dataset has been loaded.
+    if args.backend == "auto":
+        args.backend = detect_backend()
+        emit("backend_selected", backend=args.backend)
+    else:
+        module, hint = BACKEND_PROBES[args.backend]
+        if importlib.util.find_spec(module) is None:
+            emit_error(f"Backend '{args.backend}' is not installed. Install with: {hint}")
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Load data
+    # Validate the data with a cheap counting pass; the backends stream the
+    # file again so the full dataset never lives in memory here.
     emit("loading_data", 0.01)
-    entries = load_training_data(args.data)
-    if not entries:
+    num_examples = sum(1 for _ in iter_chatml(args.data))
+    if not num_examples:
         emit_error("No valid training entries found in the data file.")
 
-    dataset = format_for_training(entries)
-    emit("data_loaded", 0.03, data_points=len(dataset))
+    emit("data_loaded", 0.03, data_points=num_examples)
+
+    # Discover the GGUF converter before training starts so a missing script
+    # surfaces now, not after an hour-long run.
+    convert_cmd = find_gguf_converter()
+    if convert_cmd is None:
+        emit("warning", message="GGUF conversion script not found; the trained model "
+             "will be left in HuggingFace format.")
 
     start_time = time.time()
 
     # Dispatch to the selected backend
-    merged_dir: str
+    merged_dir: Path
     if args.backend == "unsloth":
         try:
             merged_dir = train_unsloth(
-                args.base_model, dataset, args.output_dir,
+                args.base_model, args.data, num_examples, output_dir,
                 args.lora_rank, args.epochs, args.batch_size, args.lr,
             )
         except ImportError as e:
@@ -469,7 +737,7 @@ def main():
     elif args.backend == "mlx":
         try:
             merged_dir = train_mlx(
-                args.base_model, dataset, args.output_dir,
+                args.base_model, args.data, num_examples, output_dir,
                 args.lora_rank, args.epochs, args.batch_size, args.lr,
             )
         except ImportError as e:
@@ -477,8 +745,10 @@ def main():
     elif args.backend == "transformers":
         try:
             merged_dir = train_transformers(
-                args.base_model, dataset, args.output_dir,
+                args.base_model, args.data, num_examples, output_dir,
                 args.lora_rank, args.epochs, args.batch_size, args.lr,
+                quantize=args.quantize,
+                compile_model=args.compile,
             )
         except ImportError as e:
             emit_error(f"Transformers not available: {e}. Install with: pip install transformers peft datasets")
@@ -487,7 +757,16 @@ def main():
 
     # Convert to GGUF
     model_name = args.base_model.replace("/", "_") + "-openclaw-lora"
-    output_path = convert_to_gguf(merged_dir, args.output_dir, model_name)
+    gguf_proc, output_path = convert_to_gguf(merged_dir, output_dir, model_name, convert_cmd)
+
+    # Block on the conversion only now, right before the final status goes out.
+    if gguf_proc is not None:
+        if gguf_proc.wait() != 0:
+            emit("warning", message="GGUF conversion failed; see gguf-convert.log in the "
+                 "output directory. Merged model is still available.")
+            output_path = merged_dir
+        else:
+            emit("gguf_complete", 0.95)
 
     elapsed = time.time() - start_time
     hours, remainder = divmod(int(elapsed), 3600)
@@ -495,9 +774,9 @@ def main():
     training_time = f"{hours}h {minutes}m {seconds}s" if hours else f"{minutes}m {seconds}s"
 
     emit("complete", 1.0,
-         model_path=output_path,
+         model_path=str(output_path),
          training_time=training_time,
-         data_points=len(dataset))
+         data_points=num_examples)
 
 
 if __name__ == "__main__":